@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Ledger of rent payments indexed by (room, year, month), used to detect
+missing months, months paid twice and prorata months which do not line up
+with a tenant change before any rent receipt is rendered.
+"""
+import sys
+from calendar import monthrange
+
+from quittance import parse_date
+
+
+def build_ledger(list_dict_rent_receipt):
+    """
+    Index rent receipts dictionaries by room, year and month.
+
+    Parameters
+    ----------
+    list_dict_rent_receipt : list
+        List of dictionaries returned by extract_data_from_account_statement
+
+    Returns
+    -------
+    ledger : dict
+        Dictionary with (room, year, month number) as key and list of
+        positions in list_dict_rent_receipt as value
+    """
+    ledger = dict()
+    for position, rent_receipt in enumerate(list_dict_rent_receipt):
+        for month, day in zip(
+            rent_receipt["mois"], rent_receipt["date_paiement"]
+        ):
+            month_date = parse_date(month)
+            if month_date is None:
+                print(
+                    f"Error in csv file. Month {month} cannot be identified "
+                    f"for transaction of {day} "
+                    f"({' '.join(rent_receipt['locataire'])}, "
+                    f"room {rent_receipt['chambre']})"
+                )
+                sys.exit()
+            number_month = month_date.month
+            year = rent_year(number_month, parse_date(day))
+            key = (rent_receipt["chambre"], year, number_month)
+            ledger.setdefault(key, list()).append(position)
+    return ledger
+
+
+def rent_year(number_month, payment_date):
+    """
+    Deduce year of the rented month from payment date. A December rent paid
+    in January belongs to previous year and a January rent paid in December
+    to next year.
+
+    Parameters
+    ----------
+    number_month : int
+        Month number of the rent
+    payment_date : datetime.datetime
+        Date of payment
+
+    Returns
+    -------
+    year : int
+        Year of the rent
+    """
+    year = payment_date.year
+    if number_month == 12 and payment_date.month == 1:
+        year -= 1
+    elif number_month == 1 and payment_date.month == 12:
+        year += 1
+    return year
+
+
+def occupancy(ledger, list_dict_rent_receipt, room, year, month):
+    """
+    Return tenants who paid a rent for a given room and month.
+
+    Parameters
+    ----------
+    ledger : dict
+        Dictionary returned by build_ledger
+    list_dict_rent_receipt : list
+        List of dictionaries used to build ledger
+    room : int
+        Number of the room in the apartment
+    year : int
+        Year of the rent
+    month : int
+        Month number of the rent
+
+    Returns
+    -------
+    tenants : list
+        Tenants name with civility, empty if the room is not paid this month
+    """
+    tenants = [
+        " ".join(list_dict_rent_receipt[position]["locataire"])
+        for position in ledger.get((room, year, month), list())
+    ]
+    return tenants
+
+
+def rent_period(rent_receipt, year, month):
+    """
+    Return first and last day paid by a rent receipt within its month.
+
+    Parameters
+    ----------
+    rent_receipt : dict
+        Dictionary containing information about rent receipt
+    year : int
+        Year of the rent
+    month : int
+        Month number of the rent
+
+    Returns
+    -------
+    first : int
+        First day of month paid
+    last : int
+        Last day of month paid
+    """
+    if "customized" in rent_receipt:
+        begin, end, amount = rent_receipt["customized"].split()
+        return int(begin[:2]), int(end[:2])
+    return 1, monthrange(year, month)[1]
+
+
+def shift_month(key, shift):
+    """
+    Return ledger key of the same room shifted by a number of months.
+
+    Parameters
+    ----------
+    key : tuple
+        Ledger key (room, year, month number)
+    shift : int
+        Number of months to add, negative for previous months
+
+    Returns
+    -------
+    shifted_key : tuple
+        Ledger key (room, year, month number)
+    """
+    room, year, month = key
+    ordinal = year * 12 + month - 1 + shift
+    shifted_key = (room, ordinal // 12, ordinal % 12 + 1)
+    return shifted_key
+
+
+def find_gaps(ledger):
+    """
+    Find months without any payment for a room, between the first and the
+    last month paid for this room.
+
+    Parameters
+    ----------
+    ledger : dict
+        Dictionary returned by build_ledger
+
+    Returns
+    -------
+    gaps : list
+        Ledger keys of missing months
+    """
+    rooms = dict()
+    for key in ledger:
+        rooms.setdefault(key[0], list()).append(key)
+    gaps = list()
+    for keys in rooms.values():
+        first, last = min(keys), max(keys)
+        key = shift_month(first, 1)
+        while key < last:
+            if key not in ledger:
+                gaps.append(key)
+            key = shift_month(key, 1)
+    return sorted(gaps)
+
+
+def find_overlaps(ledger, list_dict_rent_receipt):
+    """
+    Find months for which several payments of a room cover the same days.
+    Overlapping payments of the same tenant are duplicates, overlapping
+    payments of different tenants are inconsistent with a tenant change.
+
+    Parameters
+    ----------
+    ledger : dict
+        Dictionary returned by build_ledger
+    list_dict_rent_receipt : list
+        List of dictionaries used to build ledger
+
+    Returns
+    -------
+    duplicates : dict
+        Dictionary with ledger key as key and positions of rent receipts paid
+        twice by the same tenant as value
+    tenant_overlaps : dict
+        Dictionary with ledger key as key and positions of rent receipts of
+        different tenants covering the same days as value
+    """
+    duplicates = dict()
+    tenant_overlaps = dict()
+    for key, positions in ledger.items():
+        if len(positions) < 2:
+            continue
+        periods = sorted(
+            (rent_period(list_dict_rent_receipt[position], *key[1:]), position)
+            for position in positions
+        )
+        same_tenant, other_tenant = compare_periods(
+            periods, list_dict_rent_receipt
+        )
+        if same_tenant:
+            duplicates[key] = sorted(same_tenant)
+        if other_tenant:
+            tenant_overlaps[key] = sorted(other_tenant)
+    return duplicates, tenant_overlaps
+
+
+def compare_periods(periods, list_dict_rent_receipt):
+    """
+    Compare each period paid within a month with the one ending last among
+    previous periods, of the same tenant and of any tenant.
+
+    Parameters
+    ----------
+    periods : list
+        Sorted list of ((first day, last day), position) of rent receipts
+    list_dict_rent_receipt : list
+        List of dictionaries used to build ledger
+
+    Returns
+    -------
+    same_tenant : set
+        Positions of overlapping rent receipts of the same tenant
+    other_tenant : set
+        Positions of overlapping rent receipts of different tenants
+    """
+    same_tenant = set()
+    other_tenant = set()
+    last_end = dict()
+    overall_end = (0, None)
+    for (first, last), position in periods:
+        tenant = tuple(list_dict_rent_receipt[position]["locataire"])
+        end, previous = last_end.get(tenant, (0, None))
+        if first <= end:
+            same_tenant.update([previous, position])
+        if first <= overall_end[0]:
+            other = list_dict_rent_receipt[overall_end[1]]["locataire"]
+            if tuple(other) != tenant:
+                other_tenant.update([overall_end[1], position])
+        last_end[tenant] = max((end, previous), (last, position))
+        overall_end = max(overall_end, (last, position))
+    return same_tenant, other_tenant
+
+
+def later_payments(positions, list_dict_rent_receipt):
+    """
+    Return positions of rent receipts paid after the first one of the same
+    tenant, among rent receipts paying the same days.
+
+    Parameters
+    ----------
+    positions : list
+        Positions of rent receipts paying the same days
+    list_dict_rent_receipt : list
+        List of dictionaries used to build ledger
+
+    Returns
+    -------
+    later : list
+        Positions of every rent receipt but the first paid by each tenant
+    """
+    payments = sorted(
+        (
+            parse_date(list_dict_rent_receipt[position]["date_paiement"][0]),
+            position,
+        )
+        for position in positions
+    )
+    first_paid = dict()
+    for payment, position in payments:
+        tenant = tuple(list_dict_rent_receipt[position]["locataire"])
+        first_paid.setdefault(tenant, position)
+    later = [
+        position
+        for position in positions
+        if position not in first_paid.values()
+    ]
+    return later
+
+
+def find_prorata_mismatch(ledger, list_dict_rent_receipt):
+    """
+    Find prorata payments whose tenant also pays the month before the
+    beginning of the prorata period or the month after its end, which means
+    prorata does not correspond to a tenant change. Days next to the prorata
+    period paid by the same tenant within the month are not a tenant change.
+
+    Parameters
+    ----------
+    ledger : dict
+        Dictionary returned by build_ledger
+    list_dict_rent_receipt : list
+        List of dictionaries used to build ledger
+
+    Returns
+    -------
+    mismatch : dict
+        Dictionary with ledger key as key and positions of mismatching rent
+        receipts as value
+    """
+    mismatch = dict()
+    for key, positions in ledger.items():
+        for position in positions:
+            rent_receipt = list_dict_rent_receipt[position]
+            if "customized" not in rent_receipt:
+                continue
+            for neighbour in prorata_neighbours(
+                ledger, list_dict_rent_receipt, key, position
+            ):
+                tenants = [
+                    list_dict_rent_receipt[other]["locataire"]
+                    for other in ledger.get(neighbour, list())
+                ]
+                if rent_receipt["locataire"] in tenants:
+                    mismatch.setdefault(key, list()).append(position)
+                    break
+    return mismatch
+
+
+def prorata_neighbours(ledger, list_dict_rent_receipt, key, position):
+    """
+    Return months which must not be paid by the tenant of a prorata payment.
+    Arrival is checked with previous month, departure with next one, unless
+    the same tenant pays the adjacent days within the month.
+
+    Parameters
+    ----------
+    ledger : dict
+        Dictionary returned by build_ledger
+    list_dict_rent_receipt : list
+        List of dictionaries used to build ledger
+    key : tuple
+        Ledger key (room, year, month number) of the prorata payment
+    position : int
+        Position of the prorata payment in list_dict_rent_receipt
+
+    Returns
+    -------
+    neighbours : list
+        Ledger keys of previous and/or next month
+    """
+    rent_receipt = list_dict_rent_receipt[position]
+    first, last = rent_period(rent_receipt, *key[1:])
+    own_days = set()
+    for other in ledger[key]:
+        other_receipt = list_dict_rent_receipt[other]
+        if other != position and (
+            other_receipt["locataire"] == rent_receipt["locataire"]
+        ):
+            other_first, other_last = rent_period(other_receipt, *key[1:])
+            own_days.update(range(other_first, other_last + 1))
+    neighbours = list()
+    if first > 1 and first - 1 not in own_days:
+        neighbours.append(shift_month(key, -1))
+    if last < monthrange(*key[1:])[1] and last + 1 not in own_days:
+        neighbours.append(shift_month(key, 1))
+    return neighbours
+
+
+def anomaly_report(list_dict_rent_receipt):
+    """
+    Build the ledger of rent receipts and print every anomaly found.
+
+    Parameters
+    ----------
+    list_dict_rent_receipt : list
+        List of dictionaries returned by extract_data_from_account_statement
+
+    Returns
+    -------
+    wrong_positions : set
+        Positions in list_dict_rent_receipt of rent receipts which should not
+        be rendered
+    """
+    ledger = build_ledger(list_dict_rent_receipt)
+    wrong_positions = set()
+    for room, year, month in find_gaps(ledger):
+        print(f"Warning: no rent paid for room {room} in {month:02d}/{year}")
+    duplicates, tenant_overlaps = find_overlaps(ledger, list_dict_rent_receipt)
+    # Only anomalies which make a rent receipt wrong are skipped, the first
+    # payment of days paid twice being right
+    checks = [
+        ("paid twice", duplicates, later_payments),
+        (
+            "prorata without tenant change",
+            find_prorata_mismatch(ledger, list_dict_rent_receipt),
+            lambda positions, records: positions,
+        ),
+        (
+            "paid by several tenants for the same days",
+            tenant_overlaps,
+            lambda positions, records: list(),
+        ),
+    ]
+    for label, anomalies, skipped in checks:
+        for (room, year, month), positions in sorted(anomalies.items()):
+            tenants = ", ".join(
+                " ".join(list_dict_rent_receipt[position]["locataire"])
+                for position in positions
+            )
+            print(
+                f"Warning: rent {label} for room {room} in {month:02d}/{year}"
+                f" ({tenants})"
+            )
+            wrong_positions.update(skipped(positions, list_dict_rent_receipt))
+    return wrong_positions
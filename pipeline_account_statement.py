@@ -3,12 +3,19 @@
 """
 @author: nicollemathieu
 """
+import argparse
 import sys
 from calendar import monthrange
 
 import pandas as pd
 
-from quittance import save_rent_receipt
+from ledger import anomaly_report
+from quittance import (
+    plan_rent_receipt,
+    render_plan,
+    render_receipts,
+    save_plan,
+)
 
 
 def read_and_clean_csv_file(file):
@@ -239,13 +246,63 @@ def compute_sum_rent_receipt(file):
 
 
 if __name__ == "__main__":
+    # Optional planning mode to split computation from pdf compilation
+    parser = argparse.ArgumentParser(
+        description="Create rent receipts from a year account statement"
+    )
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument(
+        "--plan",
+        metavar="PLAN_FILE",
+        help="write latex variables of every rent receipt in JSON Lines "
+        "format without compiling any pdf",
+    )
+    group.add_argument(
+        "--render",
+        metavar="PLAN_FILE",
+        help="compile rent receipts from a plan file written with --plan",
+    )
+    parser.add_argument(
+        "--ignore-anomalies",
+        action="store_true",
+        help="keep rent receipts reported as anomalies by the ledger check",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=["latex", "stamp"],
+        default="latex",
+        help="stamp writes values onto a template compiled once instead of "
+        "compiling each rent receipt with latex",
+    )
+    args = parser.parse_args()
+    if args.render:
+        render_plan(args.render, args.engine)
+        sys.exit()
     # Define csv file corresponding to a year account statement
     csv_file = "used_files/input_file.csv"
     # Fetch data from csv file
     all_rent_receipt = extract_data_from_account_statement(csv_file)
-    # Creating rent receipt for each dictionary in the list
+    # Checking missing and duplicate payments before any pdf processing
+    wrong_positions = anomaly_report(all_rent_receipt)
+    if wrong_positions and not args.ignore_anomalies:
+        print(
+            f"Information: {len(wrong_positions)} rent receipts reported "
+            f"above are skipped, use --ignore-anomalies to keep them"
+        )
+        all_rent_receipt = [
+            rr
+            for position, rr in enumerate(all_rent_receipt)
+            if position not in wrong_positions
+        ]
+    # Gathering every rent receipt before any pdf processing
+    plan = list()
     for rr in all_rent_receipt:
-        save_rent_receipt(rr)
+        plan.extend(plan_rent_receipt(rr))
+    if args.plan:
+        save_plan(plan, args.plan)
+    else:
+        # Creating rent receipt for each dictionary in the plan
+        render_receipts(plan, args.engine)
     # Log rent receipt sum
     sum_rent_receipt = compute_sum_rent_receipt(csv_file)
     print(f"\nInformation: Sum rent receipt is = {sum_rent_receipt} €\n")
@@ -7,10 +7,12 @@ Version number : 1.0.2
 @author: nicollemathieu
 """
 import datetime
+import json
 import locale
 import os
 import sys
 from calendar import monthrange
+from functools import lru_cache
 
 import dateparser
 import yaml
@@ -19,6 +21,8 @@ from latex import build_pdf
 from latex.jinja2 import make_env
 from num2words import num2words
 
+from stamp import build_stamp_template, fits_template, stamp_to_pdf
+
 
 def read_yaml(yaml_file):
     """
@@ -124,17 +128,34 @@ def processing_yaml(input_dict):
         input_dict
     )
     # Adding absolute path to signature image
-    cwd = os.getcwd()
-    owner1 = "used_files/image/Signature_proprietaire1.jpg"
-    owner2 = "used_files/image/Signature_proprietaire2.jpg"
-    output_dict["signature_proprietaire1"] = os.path.join(cwd, owner1)
-    output_dict["signature_proprietaire2"] = os.path.join(cwd, owner2)
+    output_dict.update(signature_paths())
     # Customized option if specified in yaml file
     if "customized" in input_dict.keys():
         output_dict = option_customized(output_dict, input_dict["customized"])
     return output_dict
 
 
+def signature_paths():
+    """
+    Define absolute path of owners signature images based on current working
+    directory.
+
+    Returns
+    -------
+    signatures : dict
+        Dictionary containing absolute path of each signature image with latex
+        variable name as key
+    """
+    cwd = os.getcwd()
+    owner1 = "used_files/image/Signature_proprietaire1.jpg"
+    owner2 = "used_files/image/Signature_proprietaire2.jpg"
+    signatures = {
+        "signature_proprietaire1": os.path.join(cwd, owner1),
+        "signature_proprietaire2": os.path.join(cwd, owner2),
+    }
+    return signatures
+
+
 def option_customized(output_dict, info):
     """
     Customized latex dictionary for a non full occupied month
@@ -162,12 +183,10 @@ def option_customized(output_dict, info):
     charges = round(ratio_charges * float(amount), 2)
     loyer = round(float(amount) - charges, 2)
     # Verifying format of input date
-    begin = dateparser.parse(begin, languages=["fr"]).strftime("%d/%m/%Y")
-    end = dateparser.parse(end, languages=["fr"]).strftime("%d/%m/%Y")
+    begin = parse_date(begin).strftime("%d/%m/%Y")
+    end = parse_date(end).strftime("%d/%m/%Y")
     # Replacing output_dict values
-    day_payed = dateparser.parse(
-        output_dict["date_paiement"], languages=["fr"]
-    )
+    day_payed = parse_date(output_dict["date_paiement"])
     day_signed = day_payed + datetime.timedelta(days=2)
     output_dict["date_signature"] = day_signed.strftime("%d/%m/%Y")
     # Adding rent and rental charge amount
@@ -192,14 +211,10 @@ def option_customized(output_dict, info):
         )
     # Adding date of the rent
     locale.setlocale(locale.LC_ALL, "fr_FR.UTF-8")
-    begin_letter_list = (
-        dateparser.parse(begin, languages=["fr"]).strftime("%d %B %Y").split()
-    )
-    end_letter_list = (
-        dateparser.parse(end, languages=["fr"]).strftime("%d %B %Y").split()
-    )
+    begin_letter_list = parse_date(begin).strftime("%d %B %Y").split()
+    end_letter_list = parse_date(end).strftime("%d %B %Y").split()
     # Capitalize month letter
-    month_letter = dateparser.parse(end, languages=["fr"]).strftime("%B")
+    month_letter = parse_date(end).strftime("%B")
     month_letter_cap = month_letter.capitalize()
     begin_letter_list[1] = month_letter_cap
     end_letter_list[1] = month_letter_cap
@@ -209,7 +224,7 @@ def option_customized(output_dict, info):
     return output_dict
 
 
-def saving_path(yaml_dict):
+def receipt_file_name(yaml_dict):
     """
     Define name of rent receipt in pdf format.
     Format output file = YYYY_MM_locX_name_locataire.pdf where :
@@ -224,26 +239,63 @@ def saving_path(yaml_dict):
 
     Returns
     -------
-    file_path : str
-        Relative path for saving the output rent receipt.
+    name_file : str
+        Name of the output rent receipt.
     """
     # Fetch current iteration
     i = yaml_dict["iteration"]
     # Format output file = YYYY_MM_locX_name_locataire.pdf
-    month = dateparser.parse(yaml_dict["mois"][i]).strftime("%m")
+    month = parse_date(yaml_dict["mois"][i]).strftime("%m")
     year = str(yaml_dict["annee"])
     name = "_".join(yaml_dict["locataire"][1:])
     num_loc = yaml_dict["chambre"]
     name_file = "{0}_{1}_loc{2}_{3}.pdf".format(
         year, month, str(num_loc), name
     )
+    return name_file
+
+
+def output_folder():
+    """
+    Define folder where rent receipts are saved and create it if missing.
+
+    Returns
+    -------
+    namedir : str
+        Absolute path of the output folder "quittances_out"
+    """
     current_dir = os.getcwd()
     namedir = os.path.join(current_dir, "quittances_out")
     if not os.path.exists(namedir):
         os.makedirs(namedir)
-    # Defining relative path of the output rent receipt
-    file_path = os.path.join(namedir, name_file)
-    return file_path
+    return namedir
+
+
+@lru_cache(maxsize=None)
+def parse_date(text):
+    """
+    Convert a date or a month name in french into a datetime object. Numeric
+    dates are converted directly, other texts are parsed with dateparser once
+    per distinct text.
+
+    Parameters
+    ----------
+    text : str
+        Date in format dd/mm/yyyy or dd/mm/yy, or text understood by
+        dateparser (i.e month name)
+
+    Returns
+    -------
+    date : datetime.datetime
+        Date corresponding to text
+    """
+    for date_format in ("%d/%m/%Y", "%d/%m/%y"):
+        try:
+            return datetime.datetime.strptime(text, date_format)
+        except ValueError:
+            pass
+    date = dateparser.parse(text, languages=["fr"])
+    return date
 
 
 def signed_day(month, year):
@@ -264,8 +316,8 @@ def signed_day(month, year):
         String of rent receipt signature in format "XX/XX/XX"
     """
     day = 15
-    date_formatted = dateparser.parse(
-        "{0} {1} {2}".format(str(day), month, year), languages=["fr"]
+    date_formatted = datetime.date(
+        int(year), parse_date(month).month, day
     ).strftime("%d/%m/%y")
     return date_formatted
 
@@ -286,9 +338,7 @@ def receipt_day(yaml_info):
         String of rent receipt signature in format "XX/XX/XX"
     """
     day = yaml_info["date_paiement"][yaml_info["iteration"]]
-    date_formatted = dateparser.parse(day, languages=["fr"]).strftime(
-        "%d/%m/%Y"
-    )
+    date_formatted = parse_date(day).strftime("%d/%m/%Y")
     return date_formatted
 
 
@@ -312,7 +362,7 @@ def first_last_day(yaml_info):
     # Fetch current iteration
     i = yaml_info["iteration"]
     # Deducing month number based on a string
-    number_month = dateparser.parse(yaml_info["mois"][i]).month
+    number_month = parse_date(yaml_info["mois"][i]).month
     # Determining number of days of this month given the year
     number_last = monthrange(yaml_info["annee"], number_month)[1]
     # Define output variables
@@ -385,14 +435,99 @@ def save_rent_receipt(input_dict):
     -------
     None
     """
+    render_receipts(plan_rent_receipt(input_dict))
+
+
+def plan_rent_receipt(input_dict):
+    """
+    Compute latex variables and output file name of each rent receipt
+    described by input_dict without compiling any pdf.
+
+    Parameters
+    ----------
+    input_dict : dict
+        Dictionary containing necessary information to establish rent receipt.
+
+    Returns
+    -------
+    plan : list
+        List of dictionaries, one per rent receipt, with keys "fichier" (name
+        of the output pdf file) and "latex" (dictionary of latex variables
+        without signature paths, which are resolved when rendering)
+    """
+    plan = list()
     for number, mois in enumerate(input_dict["mois"]):
         input_dict["iteration"] = number
         # Fetch information for latex variables
         latex_dict = processing_yaml(input_dict)
-        # Definition of saving file and folder
-        output_path = saving_path(input_dict)
-        # Latex to PDF processing
-        latex_to_pdf(latex_dict, output_path)
+        # Only file name is kept so that plan can be rendered elsewhere
+        for key in signature_paths():
+            del latex_dict[key]
+        name_file = receipt_file_name(input_dict)
+        plan.append({"fichier": name_file, "latex": latex_dict})
+    return plan
+
+
+def save_plan(plan, plan_file):
+    """
+    Write rent receipt plan in JSON Lines format, one rent receipt per line.
+
+    Parameters
+    ----------
+    plan : list
+        List of dictionaries returned by plan_rent_receipt
+    plan_file : str
+        Relative path of the JSON Lines file to write
+    """
+    with open(plan_file, "w", encoding="utf-8") as stream:
+        for receipt in plan:
+            stream.write(json.dumps(receipt, ensure_ascii=False) + "\n")
+    print(f"Enregistrement {plan_file} ({len(plan)} quittances) --> SUCCESS")
+
+
+def render_plan(plan_file, engine="latex"):
+    """
+    Create rent receipts in pdf format from a plan file written by save_plan.
+
+    Parameters
+    ----------
+    plan_file : str
+        Relative path of the JSON Lines file containing rent receipt plan
+    engine : str
+        Rendering engine, either "latex" or "stamp"
+    """
+    with open(plan_file, encoding="utf-8") as stream:
+        plan = [json.loads(line) for line in stream if line.strip()]
+    render_receipts(plan, engine)
+
+
+def render_receipts(plan, engine="latex"):
+    """
+    Create rent receipts in pdf format from a plan. Signature paths are
+    resolved again on the current machine.
+    With "stamp" engine, latex template is compiled once and values of each
+    rent receipt are written onto the compiled template. Rent receipts with a
+    value too wide for the template are compiled with latex.
+
+    Parameters
+    ----------
+    plan : list
+        List of dictionaries returned by plan_rent_receipt
+    engine : str
+        Rendering engine, either "latex" or "stamp"
+    """
+    template_file = "used_files/template.tex"
+    stamp_template = None
+    for receipt in plan:
+        latex_dict = receipt["latex"]
+        latex_dict.update(signature_paths())
+        output_path = os.path.join(output_folder(), receipt["fichier"])
+        if engine == "stamp" and stamp_template is None:
+            stamp_template = build_stamp_template(latex_dict, template_file)
+        if engine == "stamp" and fits_template(stamp_template, latex_dict):
+            stamp_to_pdf(stamp_template, latex_dict, output_path)
+        else:
+            latex_to_pdf(latex_dict, output_path)
 
 
 if __name__ == "__main__":
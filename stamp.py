@@ -0,0 +1,507 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LaTeX-free rendering engine. The latex template is compiled once with a blank
+space reserved for each variable, pdfTeX recording position and font of each
+space, then every rent receipt is produced by writing its values onto a copy
+of the compiled template with pypdf.
+
+Limitations :
+- values are written with a standard Helvetica font, not with the sans serif
+  font used by latex for the rest of the rent receipt;
+- values are written into the space reserved in the template by
+  RESERVED_TEXT, aligned left, right or centred as the surrounding latex
+  paragraph, so paragraphs are not reflowed;
+- rent receipts with a value wider than its space must be compiled with latex
+  (see fits_template).
+"""
+import io
+import sys
+
+from jinja2.loaders import FileSystemLoader
+from latex import build_pdf
+from latex.jinja2 import make_env
+from pypdf import PageObject, PdfReader, PdfWriter
+from pypdf.generic import (
+    DecodedStreamObject,
+    DictionaryObject,
+    NameObject,
+)
+
+# Latex variables written by the engine with the text reserving their space
+RESERVED_TEXT = {
+    "mois": "de Septembre",
+    "annee": "0000",
+    "locataire_entete": "Mlle Xxxxxxxxxx Xxxxxxxxxx",
+    "locataire_texte": "Mademoiselle Xxxxxxxxxx Xxxxxxxxxx",
+    "date_signature": "00/00/0000",
+    "chambre": "00",
+    "montant_total_texte": "trois cent quatre-vingt-dix-neuf euros",
+    "montant_total": "000,00",
+    "debut_periode": "00 Septembre 0000",
+    "fin_periode": "00 Septembre 0000",
+    "montant_loyer": "000,00",
+    "montant_charge": "000,00",
+    "date_paiement": "00/00/0000",
+}
+
+# Each stampfield writes "index series shape size width align page x y" at
+# shipout (dimensions in sp, align being l, r or c according to paragraph
+# glue) and all records are stored in pdf information dictionary
+STAMP_PREAMBLE = r"""
+\makeatletter
+\newwrite\stamp@out
+\newread\stamp@in
+\newdimen\stamp@width
+\def\stamp@all{}
+\let\stamp@show\phantom
+\immediate\openout\stamp@out=\jobname.stp
+\DeclareRobustCommand{\stampfield}[2]{%
+\leavevmode
+\settowidth{\stamp@width}{#2}%
+\edef\stamp@line{#1 \f@series\space\f@shape\space\f@size\space
+\number\stamp@width\space
+\ifnum\gluestretchorder\leftskip>0
+\ifnum\gluestretchorder\rightskip>0 c\else r\fi
+\else l\fi}%
+\pdfsavepos
+\edef\stamp@write{\write\stamp@out{\stamp@line\space
+\noexpand\the\noexpand\c@page\space\noexpand\the\noexpand\pdflastxpos
+\space\noexpand\the\noexpand\pdflastypos}}%
+\stamp@write
+\stamp@show{#2}}
+\AtEndDocument{%
+\clearpage
+\immediate\closeout\stamp@out
+\begingroup
+\endlinechar=-1
+\immediate\openin\stamp@in=\jobname.stp
+\loop\unless\ifeof\stamp@in
+\read\stamp@in to \stamp@record
+\xdef\stamp@all{\stamp@all\stamp@record;}%
+\repeat
+\immediate\closein\stamp@in
+\endgroup
+\pdfinfo{/StampFields (\stamp@all)}}
+\makeatother
+"""
+# Values are typeset instead of blank space to record latex output positions
+SHOW_PREAMBLE = r"""
+\makeatletter
+\let\stamp@show\@firstofone
+\makeatother
+"""
+
+# Advance width of cp1252 characters from 32 to 255 in standard fonts, from
+# Adobe font metrics (oblique fonts share the widths of upright ones)
+# fmt: off
+FONT_WIDTHS = {
+    "Helvetica": (
+        278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584,
+        278, 333, 278, 278, 556, 556, 556, 556, 556, 556, 556, 556,
+        556, 556, 278, 278, 584, 584, 584, 556, 1015, 667, 667, 722,
+        722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+        667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278,
+        278, 278, 469, 556, 333, 556, 556, 500, 556, 556, 278, 556,
+        556, 222, 222, 500, 222, 833, 556, 556, 556, 556, 333, 500,
+        278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584, 0,
+        556, 0, 222, 556, 333, 1000, 556, 556, 333, 1000, 667, 333,
+        1000, 0, 611, 0, 0, 222, 222, 333, 333, 350, 556, 1000,
+        333, 1000, 500, 333, 944, 0, 500, 667, 278, 333, 556, 556,
+        556, 556, 260, 556, 333, 737, 370, 556, 584, 333, 737, 333,
+        400, 584, 333, 333, 333, 556, 537, 278, 333, 333, 365, 556,
+        834, 834, 834, 611, 667, 667, 667, 667, 667, 667, 1000, 722,
+        667, 667, 667, 667, 278, 278, 278, 278, 722, 722, 778, 778,
+        778, 778, 778, 584, 778, 722, 722, 722, 722, 667, 667, 611,
+        556, 556, 556, 556, 556, 556, 889, 500, 556, 556, 556, 556,
+        278, 278, 278, 278, 556, 556, 556, 556, 556, 556, 556, 584,
+        611, 556, 556, 556, 556, 500, 556, 500,
+    ),
+    "Helvetica-Bold": (
+        278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584,
+        278, 333, 278, 278, 556, 556, 556, 556, 556, 556, 556, 556,
+        556, 556, 333, 333, 584, 584, 584, 611, 975, 722, 722, 722,
+        722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778,
+        667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333,
+        278, 333, 584, 556, 333, 556, 611, 556, 611, 556, 333, 611,
+        611, 278, 278, 556, 278, 889, 611, 611, 611, 611, 389, 556,
+        333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584, 0,
+        556, 0, 278, 556, 500, 1000, 556, 556, 333, 1000, 667, 333,
+        1000, 0, 611, 0, 0, 278, 278, 500, 500, 350, 556, 1000,
+        333, 1000, 556, 333, 944, 0, 500, 667, 278, 333, 556, 556,
+        556, 556, 280, 556, 333, 737, 370, 556, 584, 333, 737, 333,
+        400, 584, 333, 333, 333, 611, 556, 278, 333, 333, 365, 556,
+        834, 834, 834, 611, 722, 722, 722, 722, 722, 722, 1000, 722,
+        667, 667, 667, 667, 278, 278, 278, 278, 722, 722, 778, 778,
+        778, 778, 778, 584, 778, 722, 722, 722, 722, 667, 667, 611,
+        556, 556, 556, 556, 556, 556, 889, 556, 556, 556, 556, 556,
+        278, 278, 278, 278, 611, 611, 611, 611, 611, 611, 611, 584,
+        611, 611, 611, 611, 611, 556, 611, 556,
+    ),
+}
+# fmt: on
+
+
+def compile_template(latex_info, template_file, show_values=False):
+    """
+    Compile latex template with text variables replaced by stampfield macro.
+
+    Parameters
+    ----------
+    latex_info : dict
+        Dictionary containing information for customized rent receipt. Only
+        variables missing from RESERVED_TEXT (i.e signatures) are used,
+        unless show_values is True
+    template_file : str
+        Relative path to the latex template
+    show_values : bool
+        If True, values of latex_info are typeset instead of blank space
+
+    Returns
+    -------
+    pdf_content : bytes
+        Content of the compiled pdf
+    occurrences : dict
+        Number of occurrences of each variable in the template
+    """
+    fields = dict(latex_info)
+    preamble = STAMP_PREAMBLE
+    text = RESERVED_TEXT
+    if show_values:
+        preamble += SHOW_PREAMBLE
+        text = latex_info
+    for index, name in enumerate(RESERVED_TEXT):
+        fields[name] = "\\stampfield{%d}{%s}" % (index, text[name])
+    env = make_env(loader=FileSystemLoader("."))
+    tpl = env.get_template(template_file)
+    latex_file = tpl.render(**fields)
+    occurrences = {
+        name: latex_file.count(fields[name]) for name in RESERVED_TEXT
+    }
+    # Macro definition is inserted at the end of preamble
+    latex_file = latex_file.replace(
+        "\\begin{document}", preamble + "\\begin{document}", 1
+    )
+    pdf = build_pdf(latex_file, builder=None)
+    return bytes(pdf), occurrences
+
+
+def read_positions(pdf_content):
+    """
+    Read position and font of each variable stored by stampfield macro in pdf
+    information dictionary.
+
+    Parameters
+    ----------
+    pdf_content : bytes
+        Content of the pdf compiled with STAMP_PREAMBLE
+
+    Returns
+    -------
+    fields : dict
+        Dictionary with latex variable name as key and list of occurrences as
+        value. Each occurrence is a dictionary containing page number,
+        baseline position, font name, font size, reserved width and alignment
+        ("l", "r" or "c")
+    """
+    names = list(RESERVED_TEXT)
+    # Latex scaled point is converted into pdf point
+    sp_to_bp = 72 / 72.27 / 65536
+    fields = {name: list() for name in names}
+    metadata = PdfReader(io.BytesIO(pdf_content)).metadata or dict()
+    for record in str(metadata.get("/StampFields", "")).split(";"):
+        if not record.strip():
+            continue
+        index, series, shape, size, width, align, page, x, y = record.split()
+        fields[names[int(index)]].append(
+            {
+                "page": int(page) - 1,
+                "x": round(int(x) * sp_to_bp, 2),
+                "y": round(int(y) * sp_to_bp, 2),
+                "font": standard_font(series, shape),
+                "size": round(float(size) * 72 / 72.27, 2),
+                "width": round(int(width) * sp_to_bp, 2),
+                "align": align,
+            }
+        )
+    return fields
+
+
+def standard_font(series, shape):
+    """
+    Choose the standard pdf font closest to a latex sans serif font.
+
+    Parameters
+    ----------
+    series : str
+        Latex font series (i.e m, bx)
+    shape : str
+        Latex font shape (i.e n, it, sl)
+
+    Returns
+    -------
+    font : str
+        Name of a standard Helvetica pdf font
+    """
+    bold = "b" in series
+    oblique = shape in ("it", "sl")
+    if bold and oblique:
+        font = "Helvetica-BoldOblique"
+    elif bold:
+        font = "Helvetica-Bold"
+    elif oblique:
+        font = "Helvetica-Oblique"
+    else:
+        font = "Helvetica"
+    return font
+
+
+def build_stamp_template(latex_info, template_file="used_files/template.tex"):
+    """
+    Compile latex template once with blank space reserved for variables, in
+    order to get the base pdf and the position of each variable.
+
+    Parameters
+    ----------
+    latex_info : dict
+        Dictionary containing information for customized rent receipt
+    template_file : str
+        Relative path to the latex template
+
+    Returns
+    -------
+    stamp_template : dict
+        Dictionary containing base pdf content with key "base" and variables
+        positions and fonts with key "fields"
+    """
+    base, occurrences = compile_template(latex_info, template_file)
+    fields = read_positions(base)
+    # Every occurrence of a variable in the template must have a position
+    missing = [
+        name
+        for name in RESERVED_TEXT
+        if len(fields[name]) != occurrences[name]
+    ]
+    if missing:
+        print(
+            f"Error in latex template. Position of variables {missing} cannot "
+            f"be found in compiled template"
+        )
+        sys.exit()
+    stamp_template = {"base": base, "fields": fields}
+    return stamp_template
+
+
+def record_latex_positions(latex_info, template_file):
+    """
+    Compile a rent receipt with latex and record position of each value, in
+    order to validate positions used by this engine.
+
+    Parameters
+    ----------
+    latex_info : dict
+        Dictionary containing information for customized rent receipt
+    template_file : str
+        Relative path to the latex template
+
+    Returns
+    -------
+    fields : dict
+        Dictionary with the same format as read_positions, width being the
+        width of the value typeset by latex
+    """
+    pdf_content, occurrences = compile_template(
+        latex_info, template_file, show_values=True
+    )
+    return read_positions(pdf_content)
+
+
+def text_width(text, font, size):
+    """
+    Compute width of a text written with a standard Helvetica font.
+
+    Parameters
+    ----------
+    text : str
+        Text to write in pdf
+    font : str
+        Name of a standard Helvetica pdf font
+    size : float
+        Font size in pdf point
+
+    Returns
+    -------
+    width : float
+        Width of the text in pdf point
+    """
+    widths = FONT_WIDTHS["Helvetica-Bold" if "Bold" in font else "Helvetica"]
+    encoded = text.encode("cp1252", errors="replace")
+    width = sum(widths[code - 32] for code in encoded if code >= 32)
+    return width * size / 1000
+
+
+def fits_template(stamp_template, latex_info):
+    """
+    Check that every value of latex_info fits into the space reserved for it
+    in the base pdf.
+
+    Parameters
+    ----------
+    stamp_template : dict
+        Dictionary returned by build_stamp_template
+    latex_info : dict
+        Dictionary containing information for customized rent receipt
+
+    Returns
+    -------
+    fits : bool
+        True if rent receipt can be produced by this engine
+    """
+    for name, occurrences in stamp_template["fields"].items():
+        for field in occurrences:
+            text = str(latex_info[name])
+            if text_width(text, field["font"], field["size"]) > field["width"]:
+                return False
+    return True
+
+
+def stamp_x(field, text):
+    """
+    Compute abscissa where text begins inside the space reserved for it.
+
+    Parameters
+    ----------
+    field : dict
+        Occurrence of a variable returned by read_positions
+    text : str
+        Text to write in pdf
+
+    Returns
+    -------
+    x : float
+        Abscissa of the beginning of text in pdf point
+    """
+    margin = field["width"] - text_width(text, field["font"], field["size"])
+    shift = {"l": 0, "r": margin, "c": margin / 2}[field["align"]]
+    return field["x"] + shift
+
+
+def escape_pdf_text(text):
+    """
+    Encode text into a pdf string literal with WinAnsi encoding.
+
+    Parameters
+    ----------
+    text : str
+        Text to write in pdf
+
+    Returns
+    -------
+    literal : bytes
+        Pdf string literal including parenthesis
+    """
+    encoded = text.encode("cp1252", errors="replace")
+    for char in (b"\\", b"(", b")"):
+        encoded = encoded.replace(char, b"\\" + char)
+    literal = b"(" + encoded + b")"
+    return literal
+
+
+def stamp_to_pdf(stamp_template, latex_info, file_path):
+    """
+    Write information contained in latex_info onto a copy of the base pdf to
+    create the rent receipt in pdf format.
+
+    Parameters
+    ----------
+    stamp_template : dict
+        Dictionary returned by build_stamp_template
+    latex_info : dict
+        Dictionary containing information for customized rent receipt
+    file_path : str
+        Relative path for saving the output rent receipt
+    """
+    with open(file_path, "wb") as stream:
+        write_stamped_pdf(stamp_template, latex_info, stream)
+    print(f"Enregistrement {file_path} --> SUCCESS")
+
+
+def write_stamped_pdf(stamp_template, latex_info, stream):
+    """
+    Write rent receipt produced from the base pdf into a binary stream.
+
+    Parameters
+    ----------
+    stamp_template : dict
+        Dictionary returned by build_stamp_template
+    latex_info : dict
+        Dictionary containing information for customized rent receipt
+    stream : file object
+        Binary stream receiving the pdf content
+    """
+    reader = PdfReader(io.BytesIO(stamp_template["base"]))
+    writer = PdfWriter()
+    for number, page in enumerate(reader.pages):
+        texts = [
+            (field, str(latex_info[name]))
+            for name, occurrences in stamp_template["fields"].items()
+            for field in occurrences
+            if field["page"] == number
+        ]
+        page = writer.add_page(page)
+        if texts:
+            page.merge_page(stamp_overlay(page, texts))
+    writer.write(stream)
+
+
+def stamp_overlay(page, texts):
+    """
+    Create a page containing only the variables text at their position.
+
+    Parameters
+    ----------
+    page : pypdf.PageObject
+        Page of the base pdf on which overlay will be merged
+    texts : list
+        List of tuples (occurrence, text) for variables located on this page
+
+    Returns
+    -------
+    overlay : pypdf.PageObject
+        Page with the same size as page containing variables text
+    """
+    fonts = sorted({field["font"] for field, text in texts})
+    font_names = {font: "/StampF%d" % i for i, font in enumerate(fonts)}
+    operations = [b"BT"]
+    for field, text in texts:
+        operations.append(
+            b"%s %.2f Tf 1 0 0 1 %.2f %.2f Tm %s Tj"
+            % (
+                font_names[field["font"]].encode(),
+                field["size"],
+                stamp_x(field, text),
+                field["y"],
+                escape_pdf_text(text),
+            )
+        )
+    operations.append(b"ET")
+    content = DecodedStreamObject()
+    content.set_data(b"\n".join(operations))
+    font_resources = DictionaryObject()
+    for font, font_name in font_names.items():
+        font_resources[NameObject(font_name)] = DictionaryObject(
+            {
+                NameObject("/Type"): NameObject("/Font"),
+                NameObject("/Subtype"): NameObject("/Type1"),
+                NameObject("/BaseFont"): NameObject("/" + font),
+                NameObject("/Encoding"): NameObject("/WinAnsiEncoding"),
+            }
+        )
+    overlay = PageObject.create_blank_page(
+        width=page.mediabox.width, height=page.mediabox.height
+    )
+    overlay[NameObject("/Resources")] = DictionaryObject(
+        {NameObject("/Font"): font_resources}
+    )
+    overlay.replace_contents(content)
+    return overlay
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests of the ledger of rent payments.
+"""
+import contextlib
+import io
+import unittest
+
+from ledger import (
+    anomaly_report,
+    build_ledger,
+    find_gaps,
+    find_overlaps,
+    find_prorata_mismatch,
+    occupancy,
+)
+
+
+def rent(month, payment, tenant, room=1, customized=None):
+    """Return a rent receipt dictionary as extracted from account statement."""
+    rent_receipt = {
+        "annee": int(payment[-4:]),
+        "date_paiement": [payment],
+        "loyer": 350.0,
+        "mois": [month],
+        "chambre": room,
+        "charge": 70,
+        "locataire": ["Mr"] + tenant.split(),
+    }
+    if customized:
+        rent_receipt["customized"] = customized
+    return rent_receipt
+
+
+class TestLedger(unittest.TestCase):
+    def test_occupancy(self):
+        rents = [rent("Janvier", "04/01/2022", "xxx YYY", room=3)]
+        ledger = build_ledger(rents)
+        self.assertEqual(occupancy(ledger, rents, 3, 2022, 1), ["Mr xxx YYY"])
+        self.assertEqual(occupancy(ledger, rents, 3, 2022, 2), list())
+
+    def test_tenant_change_is_not_paid_twice(self):
+        # Rows 4 and 21 of example account statement
+        rents = [
+            rent("Janvier", "04/01/2022", "xxxx YYYY", room=2),
+            rent(
+                "Janvier",
+                "26/01/2022",
+                "xxxxx YYYYY",
+                room=2,
+                customized="21/01/22 31/01/22 109.98",
+            ),
+        ]
+        ledger = build_ledger(rents)
+        duplicates, tenant_overlaps = find_overlaps(ledger, rents)
+        self.assertEqual(duplicates, dict())
+        self.assertEqual(tenant_overlaps, {(2, 2022, 1): [0, 1]})
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(anomaly_report(rents), set())
+
+    def test_overlap_with_earlier_period(self):
+        rents = [
+            rent("Mars", "01/03/2022", "xxx YYY"),
+            rent("Mars", "02/03/2022", "xxx YYY", 1, "02/03/22 05/03/22 45"),
+            rent("Mars", "10/03/2022", "xxx YYY", 1, "10/03/22 12/03/22 34"),
+        ]
+        duplicates, tenant_overlaps = find_overlaps(build_ledger(rents), rents)
+        self.assertEqual(duplicates, {(1, 2022, 3): [0, 1, 2]})
+        self.assertEqual(tenant_overlaps, dict())
+
+    def test_only_later_payments_are_skipped(self):
+        rents = [
+            rent("Mars", "05/03/2022", "xxx YYY"),
+            rent("Mars", "01/03/2022", "xxx YYY"),
+            rent("Avril", "01/04/2022", "xxx YYY"),
+        ]
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(anomaly_report(rents), {0})
+
+    def test_december_rent_paid_in_january(self):
+        rents = [
+            rent("Novembre", "02/11/2022", "xxx YYY"),
+            rent("Décembre", "03/01/2023", "xxx YYY"),
+            rent("Janvier", "30/01/2023", "xxx YYY"),
+        ]
+        ledger = build_ledger(rents)
+        self.assertIn((1, 2022, 12), ledger)
+        self.assertEqual(find_gaps(ledger), list())
+
+    def test_prorata_without_tenant_change(self):
+        rents = [
+            rent("Janvier", "03/01/2022", "xxx YYY"),
+            rent(
+                "Février",
+                "15/02/2022",
+                "xxx YYY",
+                customized="15/02/22 28/02/22 175",
+            ),
+        ]
+        ledger = build_ledger(rents)
+        self.assertEqual(
+            find_prorata_mismatch(ledger, rents), {(1, 2022, 2): [1]}
+        )
+
+    def test_month_paid_in_two_prorata(self):
+        rents = [
+            rent("Janvier", "03/01/2022", "xxx YYY"),
+            rent("Février", "01/02/2022", "xxx YYY", 1, "01/02/22 10/02/22 1"),
+            rent("Février", "11/02/2022", "xxx YYY", 1, "11/02/22 28/02/22 2"),
+            rent("Mars", "01/03/2022", "xxx YYY"),
+        ]
+        ledger = build_ledger(rents)
+        self.assertEqual(find_prorata_mismatch(ledger, rents), dict())
+
+    def test_unidentified_month(self):
+        rents = [rent("F\ufffdvrier", "01/02/2022", "xxx YYY")]
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            with self.assertRaises(SystemExit):
+                build_ledger(rents)
+        self.assertIn("F\ufffdvrier", output.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests of the stamp engine. Comparison with latex output is skipped when
+pdflatex is not installed, run them with the docker image of the repository.
+"""
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from pypdf import PdfReader, PdfWriter
+
+import stamp
+from pipeline_account_statement import extract_data_from_account_statement
+from quittance import (
+    latex_to_pdf,
+    parse_date,
+    plan_rent_receipt,
+    signature_paths,
+)
+
+EXAMPLE_FILES = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "example_files",
+)
+
+
+def blank_template(fields):
+    """Return a stamp template made of a blank A4 page."""
+    writer = PdfWriter()
+    writer.add_blank_page(595, 842)
+    stream = io.BytesIO()
+    writer.write(stream)
+    return {"base": stream.getvalue(), "fields": fields}
+
+
+# Occurrences of the main paragraph, whose lines are not reflowed by stamp
+PARAGRAPH = {
+    ("locataire_texte", 0),
+    ("montant_total_texte", 0),
+    ("montant_total", 0),
+    ("debut_periode", 0),
+    ("fin_periode", 0),
+}
+
+
+def extract_chunks(pdf_content):
+    """Return text chunks of a pdf as (page, -y, x, text) sorted tuples."""
+    chunks = list()
+    for number, page in enumerate(PdfReader(io.BytesIO(pdf_content)).pages):
+
+        def visitor(text, cm, tm, font_dict, font_size, number=number):
+            if text.strip():
+                x = tm[4] * cm[0] + tm[5] * cm[2] + cm[4]
+                y = tm[4] * cm[1] + tm[5] * cm[3] + cm[5]
+                chunks.append((number, -y, x, text))
+
+        page.extract_text(visitor_text=visitor)
+    return sorted(chunks)
+
+
+def extract_lines(pdf_content):
+    """
+    Return text lines of a pdf sorted by position, whitespace and hyphens
+    removed, so that pdf produced by both engines can be compared.
+    """
+    lines = list()
+    chunks = extract_chunks(pdf_content)
+    for number in sorted(set(chunk[0] for chunk in chunks)):
+        lines.extend(
+            group_lines([chunk[1:] for chunk in chunks if chunk[0] == number])
+        )
+    return lines
+
+
+def group_lines(chunks):
+    """Join (-y, x, text) sorted chunks of a page into normalized lines."""
+    lines = list()
+    # Chunks whose baseline differ by less than 1 point form a line
+    line = list()
+    for y, x, text in chunks:
+        if line and y - line[0][0] > 1:
+            lines.append(normalize("".join(t for y, x, t in line)))
+            line = list()
+        line.append((y, x, text))
+        line.sort(key=lambda chunk: chunk[1])
+    if line:
+        lines.append(normalize("".join(t for y, x, t in line)))
+    return lines
+
+
+def normalize(text):
+    """Remove characters typeset differently by latex and stamp engine."""
+    text = text.replace("’", "'").replace("-", "")
+    return "".join(text.split())
+
+
+def stamped_text(chunks, field, x):
+    """Return text of chunks beginning at a given position of a field."""
+    text = [
+        normalize(chunk[3])
+        for chunk in chunks
+        if chunk[0] == field["page"]
+        if abs(chunk[1] + field["y"]) < 0.5
+        if abs(chunk[2] - x) < 1
+    ]
+    return "".join(text)
+
+
+def anchor(field, width):
+    """Return abscissa of a value which does not depend on its width."""
+    return field["x"] + {"l": 0, "r": width, "c": width / 2}[field["align"]]
+
+
+class TestStampEngine(unittest.TestCase):
+    def test_read_positions(self):
+        writer = PdfWriter()
+        writer.add_blank_page(595, 842)
+        # Variable "montant_total" (index 7) is written twice on page 1
+        writer.add_metadata(
+            {
+                "/StampFields": "7 bx n 12 3276800 l 1 6553600 32768000;"
+                "7 m it 12 3276800 c 1 13107200 6553600;"
+            }
+        )
+        stream = io.BytesIO()
+        writer.write(stream)
+        fields = stamp.read_positions(stream.getvalue())
+        self.assertEqual(len(fields["montant_total"]), 2)
+        first, second = fields["montant_total"]
+        self.assertEqual(first["font"], "Helvetica-Bold")
+        self.assertEqual(second["font"], "Helvetica-Oblique")
+        self.assertEqual(first["page"], 0)
+        self.assertAlmostEqual(first["x"], 99.63, places=2)
+        self.assertAlmostEqual(first["width"], 49.81, places=2)
+        self.assertEqual(second["align"], "c")
+        self.assertEqual(fields["mois"], list())
+
+    def test_stamp_x(self):
+        field = {"x": 100, "width": 60, "font": "Helvetica", "size": 10}
+        width = stamp.text_width("2022", "Helvetica", 10)
+        self.assertEqual(stamp.stamp_x(dict(field, align="l"), "2022"), 100)
+        self.assertAlmostEqual(
+            stamp.stamp_x(dict(field, align="r"), "2022") + width, 160
+        )
+        self.assertAlmostEqual(
+            stamp.stamp_x(dict(field, align="c"), "2022") + width / 2, 130
+        )
+
+    def test_every_occurrence_is_stamped(self):
+        occurrence = {"page": 0, "font": "Helvetica", "size": 12, "align": "l"}
+        fields = {
+            "montant_total": [
+                dict(occurrence, x=72, y=700, width=50),
+                dict(occurrence, x=72, y=600, width=50),
+            ],
+            "annee": [dict(occurrence, x=150, y=700, width=50)],
+        }
+        stream = io.BytesIO()
+        stamp.write_stamped_pdf(
+            blank_template(fields),
+            {"montant_total": "310", "annee": "2022"},
+            stream,
+        )
+        self.assertEqual(extract_lines(stream.getvalue()), ["3102022", "310"])
+
+    def test_fits_template(self):
+        field = {"page": 0, "x": 0, "y": 0, "font": "Helvetica", "size": 12}
+        field["align"] = "l"
+        width = stamp.text_width("trois cent dix euros", "Helvetica", 12)
+        template = blank_template(
+            {"montant_total_texte": [dict(field, width=width)]}
+        )
+        self.assertTrue(
+            stamp.fits_template(
+                template, {"montant_total_texte": "trois cent dix euros"}
+            )
+        )
+        self.assertFalse(
+            stamp.fits_template(
+                template,
+                {
+                    "montant_total_texte": "cent neuf euros et "
+                    "quatre-vingt-dix-huit centimes"
+                },
+            )
+        )
+
+
+@unittest.skipUnless(shutil.which("pdflatex"), "pdflatex is not installed")
+class TestStampAgainstLatex(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.mkdtemp()
+        shutil.copytree(EXAMPLE_FILES, os.path.join(self.tmp, "used_files"))
+        os.chdir(self.tmp)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmp)
+
+    def example_plan(self):
+        """Plan of example account statement rent receipts."""
+        plan = list()
+        csv_file = "used_files/input_file.csv"
+        for rr in extract_data_from_account_statement(csv_file):
+            # Month names with a broken accent in example file are skipped
+            if parse_date(rr["mois"][0]) is not None:
+                plan.extend(plan_rent_receipt(rr))
+        return plan
+
+    def assert_same_positions(self, stamp_template, latex_dict, expected):
+        """
+        Check each value is stamped where latex typesets it, and that the
+        stamped pdf contains the value at this position.
+        """
+        stream = io.BytesIO()
+        stamp.write_stamped_pdf(stamp_template, latex_dict, stream)
+        chunks = extract_chunks(stream.getvalue())
+        order = {"stamp": list(), "latex": list()}
+        for name, occurrences in stamp_template["fields"].items():
+            self.assertEqual(len(occurrences), len(expected[name]), name)
+            value = latex_dict[name]
+            for index, field in enumerate(occurrences):
+                typeset = expected[name][index]
+                x = stamp.stamp_x(field, value)
+                self.assertIn(
+                    normalize(value), stamped_text(chunks, field, x), name
+                )
+                if (name, index) in PARAGRAPH:
+                    order["stamp"].append(
+                        (field["page"], -field["y"], x, name)
+                    )
+                    order["latex"].append(
+                        (typeset["page"], -typeset["y"], typeset["x"], name)
+                    )
+                    continue
+                self.assertEqual(field["page"], typeset["page"], name)
+                self.assertAlmostEqual(field["y"], typeset["y"], delta=0.5)
+                self.assertEqual(field["align"], typeset["align"], name)
+                width = stamp.text_width(value, field["font"], field["size"])
+                # Text around a centred value moves with the value width
+                delta = 1
+                if field["align"] == "c":
+                    delta += abs(field["width"] - typeset["width"])
+                self.assertAlmostEqual(
+                    anchor(dict(field, x=x), width),
+                    anchor(typeset, typeset["width"]),
+                    delta=delta,
+                    msg=(name, index),
+                )
+        # Paragraph is not reflowed but values must keep their reading order
+        for engine in order:
+            order[engine] = [
+                occurrence[-1] for occurrence in sorted(order[engine])
+            ]
+        self.assertEqual(order["stamp"], order["latex"])
+
+    def test_same_positions_as_latex(self):
+        plan = self.example_plan()
+        template_file = "used_files/template.tex"
+        latex_dict = dict(plan[0]["latex"], **signature_paths())
+        stamp_template = stamp.build_stamp_template(latex_dict, template_file)
+        stamped = 0
+        for receipt in plan:
+            latex_dict = dict(receipt["latex"], **signature_paths())
+            if not stamp.fits_template(stamp_template, latex_dict):
+                continue
+            stamped += 1
+            expected = stamp.record_latex_positions(latex_dict, template_file)
+            self.assert_same_positions(stamp_template, latex_dict, expected)
+            # Lines out of the main paragraph are identical
+            stream = io.BytesIO()
+            stamp.write_stamped_pdf(stamp_template, latex_dict, stream)
+            latex_to_pdf(latex_dict, "latex.pdf")
+            with open("latex.pdf", "rb") as latex_pdf:
+                expected_lines = extract_lines(latex_pdf.read())
+            lines = extract_lines(stream.getvalue())
+            for result in (expected_lines, lines):
+                begin = next(
+                    i for i, line in enumerate(result) if "soussignons" in line
+                )
+                end = next(
+                    i for i, line in enumerate(result) if "droits." in line
+                )
+                del result[begin : end + 1]
+            self.assertEqual(lines, expected_lines, receipt["fichier"])
+        self.assertGreater(stamped, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()